@@ -0,0 +1,111 @@
+# bench_churn.py
+# Soak benchmark: churn add/start/stop/remove cycles through the main window
+# and check that RSS and the number of live Qt objects stay flat.
+#
+# Usage (from the auto_clicker_mac directory):
+#   python bench_churn.py [cycles]
+import gc
+import os
+import sys
+import time
+import resource
+
+# No window is shown, so don't require a display (harmless on macOS too).
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import QEventLoop, QObject, QTimer
+
+from src.gui.main_window import AutoClickerMainWindow
+
+CYCLES = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+WARMUP_CYCLES = min(1_000, CYCLES // 10)
+SAMPLE_EVERY = max(1, CYCLES // 20)
+# Long enough that no timer can ever fire (and press a real key) during the run.
+INTERVAL_SECONDS = 3600.0
+# Allowed peak RSS growth after warm-up, in MiB.
+RSS_TOLERANCE_MB = 8.0
+
+
+def rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in KiB on Linux.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def flush_deferred_deletes():
+    # deleteLater() is only honoured by a running event loop, so spin one
+    # iteration of a real loop. (sendPostedEvents(None, DeferredDelete) would
+    # delete the objects too, but never compacts Qt's posted-event list, which
+    # then shows up as 24 bytes of RSS growth per deleteLater() call.)
+    loop = QEventLoop()
+    QTimer.singleShot(0, loop.quit)
+    loop.exec()
+
+
+def settle():
+    flush_deferred_deletes()
+    gc.collect()
+
+
+def live_qt_objects(window):
+    return len(window.findChildren(QObject))
+
+
+def churn_once(window):
+    window._add_new_key_config("a", "a", INTERVAL_SECONDS)
+    config = window.key_configs[-1]
+    window._start_single_macro(config)
+    window._stop_single_macro(config)
+    window._remove_key_config(config["id"])
+    flush_deferred_deletes()
+
+
+def main():
+    app = QApplication(sys.argv)
+    window = AutoClickerMainWindow()
+
+    for _ in range(WARMUP_CYCLES):
+        churn_once(window)
+    settle()
+
+    baseline_rss = rss_mb()
+    baseline_objects = live_qt_objects(window)
+    print(f"Baseline after {WARMUP_CYCLES} warm-up cycles: "
+          f"RSS {baseline_rss:.1f} MiB, live Qt objects {baseline_objects}")
+
+    start = time.perf_counter()
+    for i in range(1, CYCLES + 1):
+        churn_once(window)
+        if i % SAMPLE_EVERY == 0:
+            settle()
+            print(f"  cycle {i:>7}: RSS {rss_mb():.1f} MiB, "
+                  f"live Qt objects {live_qt_objects(window)}")
+    settle()
+    elapsed = time.perf_counter() - start
+
+    final_rss = rss_mb()
+    final_objects = live_qt_objects(window)
+    print(f"\n{CYCLES} cycles in {elapsed:.1f} s "
+          f"({elapsed / CYCLES * 1e6:.1f} us/cycle)")
+    print(f"RSS: {baseline_rss:.1f} -> {final_rss:.1f} MiB, "
+          f"live Qt objects: {baseline_objects} -> {final_objects}")
+
+    ok = True
+    if final_objects != baseline_objects:
+        print(f"FAIL: live Qt object count grew by {final_objects - baseline_objects}")
+        ok = False
+    if final_rss - baseline_rss > RSS_TOLERANCE_MB:
+        print(f"FAIL: RSS grew by {final_rss - baseline_rss:.1f} MiB "
+              f"(tolerance {RSS_TOLERANCE_MB} MiB)")
+        ok = False
+    if ok:
+        print("OK: RSS and live Qt object counts stayed flat.")
+
+    window.close()
+    app.quit()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
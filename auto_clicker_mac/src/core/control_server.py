@@ -0,0 +1,231 @@
+"""
+本機控制伺服器：透過 Unix domain socket 遠端操作自動按鍵。
+
+協定為一行一個 JSON 物件 (UTF-8，以 "\\n" 結尾)，每個請求回應一行：
+
+    -> {"id": 1, "cmd": "add", "key": "a", "interval": 0.5}
+    <- {"id": 1, "ok": true, "result": "<config id>"}
+
+    -> {"id": 2, "batch": [{"cmd": "stop"}, {"cmd": "update", "config_id": "...", "interval": 1.0}]}
+    <- {"id": 2, "ok": true, "result": [null, null]}
+
+    -> {"id": 3, "cmd": "remove", "config_id": "nope"}
+    <- {"id": 3, "ok": false, "error": "command 0: unknown config_id 'nope'"}
+
+Commands:
+    ping                                       -> "pong"
+    telemetry                                  -> {"running": bool, "configs": [...]}
+    add     key, interval[, display_name, enabled] -> new config id
+    remove  config_id
+    start   [config_id]  (all enabled configs when omitted)
+    stop    [config_id]  (all running configs when omitted)
+    update  config_id[, interval, enabled]
+
+A "batch" frame is applied atomically: every command is validated first and
+nothing is applied if any of them is invalid.
+
+Frames longer than MAX_FRAME_BYTES (newline included) get an error response
+and the connection is closed.
+"""
+import errno
+import json
+import os
+import socket
+import socketserver
+import stat
+import tempfile
+import threading
+
+DEFAULT_CONTROL_SOCKET = os.path.join(tempfile.gettempdir(), "macquickmacro.sock")
+MAX_FRAME_BYTES = 1024 * 1024
+
+
+class ControlError(Exception):
+    """控制命令無效或無法執行，訊息會原樣回傳給客戶端"""
+
+
+class _ControlRequestHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.server.control._register_connection(self.connection)
+
+    def handle(self):
+        # One thread per client; frames on a connection are answered in order
+        control = self.server.control
+        while not control.stopped:
+            line = self.rfile.readline(MAX_FRAME_BYTES + 1)
+            if not line:
+                break
+            if len(line) > MAX_FRAME_BYTES:
+                # Can't find the start of the next frame reliably; give up on the client
+                self.wfile.write(_encode({
+                    "id": None, "ok": False,
+                    "error": f"frame exceeds {MAX_FRAME_BYTES} bytes",
+                }))
+                break
+            if not line.strip():
+                continue
+            if control.stopped: # stop() ran while we were waiting for this frame
+                break
+            self.wfile.write(control.handle_frame(line))
+
+    def finish(self):
+        self.server.control._unregister_connection(self.connection)
+        try:
+            super().finish()
+        except OSError: # The peer or stop() already closed the socket
+            pass
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class ControlServer:
+    """
+    在背景執行緒中提供控制 socket。
+
+    :param path: Unix domain socket 的路徑
+    :param telemetry: 無參數、可在任意執行緒呼叫的函式，回傳目前狀態
+    :param execute: 接收命令列表並回傳結果列表的函式 (可在任意執行緒呼叫，
+                    以 ControlError 表示命令無效)
+    """
+
+    def __init__(self, path, telemetry, execute):
+        self.path = path
+        self._telemetry = telemetry
+        self._execute = execute
+        self._server = None
+        self._thread = None
+        self._connections = set()
+        self._in_flight = 0 # execute() calls currently running
+        self._state = threading.Condition() # Guards the three fields above and `stopped`
+        self.stopped = False
+
+    def start(self):
+        if self._server is not None:
+            return
+        self.stopped = False
+
+        if os.path.exists(self.path) and stat.S_ISSOCK(os.stat(self.path).st_mode):
+            self._remove_stale_socket()
+
+        # Create the socket as 0600 right away (only the current user may
+        # control the app); a chmod() after bind() would leave a window with
+        # umask permissions on a shared directory like /tmp.
+        old_umask = os.umask(0o177)
+        try:
+            server = _UnixServer(self.path, _ControlRequestHandler)
+        finally:
+            os.umask(old_umask)
+        server.control = self
+        self._server = server
+
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="ControlServer", daemon=True
+        )
+        self._thread.start()
+        print(f"[ControlServer] Listening on {self.path}")
+
+    def _remove_stale_socket(self):
+        """移除前一次執行留下的 socket；若另一個實例仍在使用則拋出 OSError"""
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except ConnectionRefusedError:
+            os.unlink(self.path) # Nobody is listening: left behind by a crashed run
+            return
+        except FileNotFoundError:
+            return # Removed in the meantime
+        finally:
+            probe.close()
+        raise OSError(errno.EADDRINUSE, f"another instance is already listening on {self.path}")
+
+    def _register_connection(self, connection):
+        with self._state:
+            self._connections.add(connection)
+
+    def _unregister_connection(self, connection):
+        with self._state:
+            self._connections.discard(connection)
+
+    def _execute_unless_stopped(self, commands):
+        with self._state:
+            if self.stopped:
+                raise ControlError("control server is shutting down")
+            self._in_flight += 1
+        try:
+            return self._execute(commands)
+        finally:
+            with self._state:
+                self._in_flight -= 1
+                self._state.notify_all()
+
+    def stop(self):
+        if self._server is None:
+            return
+        # Stop accepting, then disconnect clients that are already connected so
+        # no further command can reach the window once stop() returns.
+        with self._state:
+            self.stopped = True
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        with self._state:
+            # execute() gives up on its own after its timeout, so this is bounded
+            self._state.wait_for(lambda: self._in_flight == 0)
+            connections = list(self._connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._server = None
+        self._thread = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def handle_frame(self, line):
+        """處理一個請求行並回傳編碼後的回應行"""
+        frame_id = None
+        try:
+            try:
+                frame = json.loads(line, parse_constant=_reject_constant)
+            except ValueError:
+                raise ControlError("invalid JSON")
+            if not isinstance(frame, dict):
+                raise ControlError("frame must be a JSON object")
+            frame_id = frame.get("id")
+
+            if "batch" in frame:
+                if not isinstance(frame["batch"], list):
+                    raise ControlError("batch must be a list of commands")
+                result = self._execute_unless_stopped(frame["batch"])
+            elif frame.get("cmd") == "ping":
+                result = "pong"
+            elif frame.get("cmd") == "telemetry":
+                # Served straight from this thread; doesn't wait on the GUI
+                result = self._telemetry()
+            else:
+                result = self._execute_unless_stopped([frame])[0]
+            response = {"id": frame_id, "ok": True, "result": result}
+        except ControlError as e:
+            response = {"id": frame_id, "ok": False, "error": str(e)}
+        except Exception as e:
+            # Never drop the connection without an answer
+            response = {"id": frame_id, "ok": False, "error": f"internal error: {type(e).__name__}: {e}"}
+
+        try:
+            encoded = _encode(response)
+        except (TypeError, ValueError) as e: # e.g. a non-finite float in the result
+            encoded = _encode({"id": None, "ok": False, "error": f"unencodable response: {e}"})
+        return encoded
+
+
+def _reject_constant(name):
+    # json.loads accepts NaN / Infinity by default; they are not valid JSON
+    raise ValueError(f"invalid constant {name}")
+
+
+def _encode(response):
+    return (json.dumps(response, ensure_ascii=False, allow_nan=False, separators=(",", ":")) + "\n").encode("utf-8")
@@ -41,6 +41,23 @@ def press_and_release_key(key_char_or_special_key):
             print("--------------------------------------------------------------------")
         return False
 
+def parse_key(key_name):
+    """
+    將按鍵名稱轉為 pynput 可用的按鍵。
+    :param key_name: 單個字符 (e.g., 'a')，或特殊按鍵名稱 (e.g., 'space', 'Key.enter')
+    :return: 單個字符或 pynput.keyboard.Key
+    :raises ValueError: 無法辨識的按鍵名稱
+    """
+    if not isinstance(key_name, str) or not key_name:
+        raise ValueError(f"無效的按鍵名稱: {key_name!r}")
+    if len(key_name) == 1:
+        return key_name
+    special_name = key_name[len("Key."):] if key_name.startswith("Key.") else key_name
+    try:
+        return Key[special_name]
+    except KeyError:
+        raise ValueError(f"無法辨識的按鍵名稱: {key_name!r}") from None
+
 if __name__ == '__main__':
     # 測試
     print("將在3秒後模擬按下 'h' 鍵...")
@@ -0,0 +1,150 @@
+import cProfile
+import gc
+import os
+import time
+import tracemalloc
+
+# Default location for capture output: ~/MacQuickMacro/profiles
+DEFAULT_PROFILE_DIR = os.path.join(os.path.expanduser("~"), "MacQuickMacro", "profiles")
+# Longest capture window accepted from the menu and from --profile, in seconds
+MAX_PROFILE_SECONDS = 24 * 60 * 60
+
+
+class ProfileSession:
+    """
+    一次效能分析擷取：CPU (cProfile) + 記憶體配置 (tracemalloc) + GC 統計。
+
+    cProfile only profiles the thread that calls start(). The macro engine runs
+    on the GUI thread (QTimer -> press_and_release_key), so starting the session
+    from the GUI thread covers both. tracemalloc and the GC callback are
+    process-wide.
+    """
+
+    def __init__(self, output_dir=DEFAULT_PROFILE_DIR, top_n=30):
+        self.output_dir = output_dir
+        self.top_n = top_n
+
+        self._profiler = None
+        self._started_tracemalloc = False
+        self._start_snapshot = None
+        self._start_time = None
+        self._gc_phase_start = None
+        self._gc_stats = {}
+
+    @property
+    def is_active(self):
+        return self._profiler is not None
+
+    def start(self):
+        if self.is_active:
+            return
+
+        # Enable cProfile first: it is the step that can fail (ValueError when
+        # another profiler is already active, Python 3.12+), and nothing else
+        # has been set up yet at that point.
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            # Respect a tracemalloc already enabled via PYTHONTRACEMALLOC / -X tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+            self._start_snapshot = tracemalloc.take_snapshot()
+
+            self._gc_stats = {gen: {"collections": 0, "collected": 0, "seconds": 0.0} for gen in range(3)}
+            gc.callbacks.append(self._on_gc)
+        except BaseException:
+            profiler.disable()
+            if self._on_gc in gc.callbacks:
+                gc.callbacks.remove(self._on_gc)
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+                self._started_tracemalloc = False
+            self._start_snapshot = None
+            raise
+
+        self._start_time = time.perf_counter()
+        self._profiler = profiler
+
+    def stop(self):
+        """
+        結束擷取並寫出結果。
+        :return: (pstats 檔案路徑, 記憶體配置報告路徑)，若未在擷取中則回傳 None
+        """
+        if not self.is_active:
+            return None
+
+        # Whatever happens while writing the output, the session must end up
+        # inactive; otherwise it could never be started or stopped again.
+        try:
+            self._profiler.disable()
+            elapsed = time.perf_counter() - self._start_time
+            end_snapshot = tracemalloc.take_snapshot()
+
+            os.makedirs(self.output_dir, exist_ok=True)
+            stats_path, report_path = self._output_paths()
+            self._profiler.dump_stats(stats_path)
+            self._write_report(report_path, end_snapshot, elapsed)
+        finally:
+            if self._on_gc in gc.callbacks:
+                gc.callbacks.remove(self._on_gc)
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+                self._started_tracemalloc = False
+            self._profiler = None
+            self._start_snapshot = None
+        return stats_path, report_path
+
+    def _output_paths(self):
+        # Millisecond timestamp plus a counter, so two captures in quick
+        # succession never overwrite each other.
+        now = time.time()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"-{int(now * 1000) % 1000:03d}"
+        base_name = f"profile-{stamp}"
+        counter = 1
+        while os.path.exists(os.path.join(self.output_dir, base_name + ".pstats")):
+            counter += 1
+            base_name = f"profile-{stamp}-{counter}"
+        return (
+            os.path.join(self.output_dir, base_name + ".pstats"),
+            os.path.join(self.output_dir, base_name + "-alloc.txt"),
+        )
+
+    def _on_gc(self, phase, info):
+        if phase == "start":
+            self._gc_phase_start = time.perf_counter()
+        elif phase == "stop" and self._gc_phase_start is not None:
+            stats = self._gc_stats[info["generation"]]
+            stats["collections"] += 1
+            stats["collected"] += info["collected"]
+            stats["seconds"] += time.perf_counter() - self._gc_phase_start
+            self._gc_phase_start = None
+
+    def _write_report(self, path, end_snapshot, elapsed):
+        trace_filters = (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        )
+        start_snapshot = self._start_snapshot.filter_traces(trace_filters)
+        end_snapshot = end_snapshot.filter_traces(trace_filters)
+
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"Capture window: {elapsed:.2f} s\n\n")
+
+            f.write("GC activity during capture:\n")
+            for gen, stats in self._gc_stats.items():
+                f.write(
+                    f"  gen {gen}: {stats['collections']} collections, "
+                    f"{stats['collected']} objects collected, "
+                    f"{stats['seconds'] * 1000:.2f} ms\n"
+                )
+
+            f.write(f"\nTop {self.top_n} allocation growth during capture (by line):\n")
+            for stat in end_snapshot.compare_to(start_snapshot, "lineno")[:self.top_n]:
+                f.write(f"  {stat}\n")
+
+            f.write(f"\nTop {self.top_n} live allocations at end of capture (by line):\n")
+            for stat in end_snapshot.statistics("lineno")[:self.top_n]:
+                f.write(f"  {stat}\n")
@@ -2,29 +2,63 @@ import sys
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QLineEdit, QListWidget, QListWidgetItem,
-    QCheckBox, QSpacerItem, QSizePolicy, QFrame, QMessageBox
+    QCheckBox, QSpacerItem, QSizePolicy, QFrame, QMessageBox, QInputDialog
 )
-from PySide6.QtCore import Qt, Slot, QTimer
+from PySide6.QtCore import Qt, Slot, Signal, QTimer
+from functools import partial
+import math
+import threading
+import time
+import traceback
 from PySide6.QtGui import QKeySequence # For displaying shortcuts nicely
+from PySide6.QtGui import QAction
 
 from .add_key_dialog import AddKeyDialog
-from ..core.key_event import press_and_release_key
+from ..core.key_event import press_and_release_key, parse_key
+from ..core.control_server import ControlError
+from ..core.profiler import ProfileSession, DEFAULT_PROFILE_DIR, MAX_PROFILE_SECONDS
 import uuid # For unique IDs
 
 class AutoClickerMainWindow(QMainWindow):
+    # Carries a control request from a ControlServer thread to the GUI thread
+    control_batch_requested = Signal(object)
+
+    # How long a control client waits for the GUI thread to apply a batch
+    CONTROL_TIMEOUT_SECONDS = 5.0
+    # Interval range accepted from control clients: QTimer takes an int of
+    # milliseconds, and anything below 1 ms would become a 0 ms busy timer.
+    MIN_INTERVAL_SECONDS = 0.001
+    MAX_INTERVAL_SECONDS = (2**31 - 1) / 1000
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("macOS 自動按鍵程式")
         self.setGeometry(100, 100, 650, 450) # x, y, width, height
 
         self.key_configs = [] # List to store key configuration dictionaries
+        self.key_rows = {} # config id -> widgets of its row in key_list_widget
+        # Telemetry built on the GUI thread for readers on other threads (control
+        # server). It is replaced as a whole and never modified in place.
+        self.telemetry_snapshot = {"running": False, "configs": ()}
+        self.telemetry_index = {} # config id -> position in telemetry_snapshot["configs"]
         self.is_globally_running = False # Flag to track overall state
 
+        self.profile_session = None # Active ProfileSession, if a capture is running
+        self.profile_timer = QTimer(self) # Ends the capture after the chosen window
+        self.profile_timer.setSingleShot(True)
+        self.profile_timer.timeout.connect(self.stop_profiling)
+        self.profile_show_result = False
+
+        self.control_batch_requested.connect(
+            self._on_control_batch_requested, Qt.ConnectionType.QueuedConnection
+        )
+
         self.central_widget = QWidget()
         self.setCentralWidget(self.central_widget)
         self.main_layout = QVBoxLayout(self.central_widget)
 
         self._init_ui()
+        self._init_menu()
         self._update_key_list_widget() # Initially populate if any data (though it's empty now)
 
     def _init_ui(self):
@@ -76,62 +110,165 @@ class AutoClickerMainWindow(QMainWindow):
         control_layout.addSpacerItem(QSpacerItem(40, 20, QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum))
         self.main_layout.addLayout(control_layout)
 
+    def _init_menu(self):
+        tools_menu = self.menuBar().addMenu("工具")
+
+        self.profile_action = QAction("效能分析 (CPU / 記憶體)", self)
+        self.profile_action.setCheckable(True)
+        self.profile_action.setToolTip("擷取一段時間的 CPU 與記憶體配置資料並寫入檔案")
+        self.profile_action.triggered.connect(self._on_profile_action_triggered)
+        tools_menu.addAction(self.profile_action)
+
+    @Slot(bool)
+    def _on_profile_action_triggered(self, checked):
+        if not checked:
+            self.stop_profiling()
+            return
+
+        seconds, ok = QInputDialog.getInt(
+            self, "效能分析", "擷取時間長度 (秒):", 30, 1, MAX_PROFILE_SECONDS
+        )
+        if not ok:
+            self.profile_action.setChecked(False)
+            return
+        self.start_profiling(seconds, show_result=True)
+
+    def start_profiling(self, duration_seconds, output_dir=DEFAULT_PROFILE_DIR, show_result=False):
+        """
+        開始一次效能分析擷取，duration_seconds 秒後自動結束並寫出結果。
+        必須在 GUI 執行緒呼叫，CPU 分析才會涵蓋按鍵計時器與介面更新。
+        """
+        if self.profile_session is not None:
+            return
+
+        self.profile_session = ProfileSession(output_dir)
+        try:
+            self.profile_session.start()
+        except ValueError as e: # e.g. another profiler is already active on this thread
+            self.profile_session = None
+            self.profile_action.setChecked(False)
+            print(f"無法開始效能分析: {e}")
+            if show_result:
+                QMessageBox.warning(self, "效能分析", f"無法開始效能分析: {e}")
+            return
+
+        self.profile_show_result = show_result
+        self.profile_action.setChecked(True)
+        self.profile_timer.start(int(duration_seconds * 1000))
+        print(f"效能分析開始，將擷取 {duration_seconds} 秒")
+
+    @Slot()
+    def stop_profiling(self):
+        if self.profile_session is None:
+            return
+
+        self.profile_timer.stop()
+        try:
+            stats_path, report_path = self.profile_session.stop()
+        except Exception as e: # e.g. the output directory can't be written
+            print(f"無法寫出效能分析結果: {type(e).__name__}: {e}")
+            if self.profile_show_result:
+                QMessageBox.warning(self, "效能分析", f"無法寫出效能分析結果:\n{e}")
+            return
+        finally:
+            self.profile_session = None
+            self.profile_action.setChecked(False)
+
+        print(f"效能分析結束\n  CPU (pstats): {stats_path}\n  記憶體配置報告: {report_path}")
+        if self.profile_show_result:
+            QMessageBox.information(
+                self, "效能分析",
+                f"擷取完成，結果已寫入:\n\nCPU (pstats): {stats_path}\n記憶體配置報告: {report_path}"
+            )
+
     def _update_key_list_widget(self):
-        """根據 self.key_configs 重新整理 QListWidget"""
-        self.key_list_widget.clear()
+        """根據 self.key_configs 同步 QListWidget (重用既有的列，只為新設定建立列)"""
+        # Rows are kept per config id and updated in place, so start/stop/toggle
+        # don't tear down and recreate widgets (and the slots connected to them).
+        live_ids = {config["id"] for config in self.key_configs}
+        for config_id in [cid for cid in self.key_rows if cid not in live_ids]:
+            self._remove_key_row(config_id)
+
         for config in self.key_configs:
-            item_widget = QWidget()
-            item_layout = QHBoxLayout(item_widget)
-            item_layout.setContentsMargins(8, 5, 8, 5) # top, bottom, left, right
-
-            checkbox = QCheckBox()
-            checkbox.setChecked(config["enabled"])
-            checkbox.stateChanged.connect(lambda state, cfg_id=config["id"]: self._toggle_key_config_enabled(cfg_id, state))
-            item_layout.addWidget(checkbox)
-
-            key_display_str = config["display_name"]
-            # Attempt to make common special keys more readable
-            if "key." in key_display_str: # pynput special keys often come as "Key.something"
-                key_display_str = key_display_str.replace("key.", "").capitalize()
-
-            key_display_str = config["display_name"]
-            if "key." in key_display_str:
-                key_display_str = key_display_str.replace("key.", "").capitalize()
-
-            status_indicator = "▶️" if config.get("is_running") else "⏸️" # Play/Pause emoji as indicator
-            key_text = f"{status_indicator} 按鍵: <b>{key_display_str}</b>"
-            if config.get("is_running"):
-                 key_text = f"<font color='green'>{key_text}</font>"
-
-            key_label = QLabel(key_text)
-            key_label.setToolTip(f"內部按鍵碼: {config['key_actual_for_pynput']}\nID: {config['id']}")
-            item_layout.addWidget(key_label)
-
-            interval_label = QLabel(f"間隔: {config['interval']:.2f} 秒")
-            if config.get("is_running"):
-                interval_label.setStyleSheet("color: green;")
-            item_layout.addWidget(interval_label)
-
-            item_layout.addSpacerItem(QSpacerItem(20, 20, QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum))
-
-            remove_button = QPushButton("🗑️ 移除") # Trash can emoji
-            remove_button.setFixedSize(80, 28)
-            remove_button.setStyleSheet(
-                "QPushButton { background-color: #d9534f; color: white; border-radius: 3px; padding: 4px; }"
-                "QPushButton:hover { background-color: #c9302c; }"
-                "QPushButton:pressed { background-color: #ac2925; }"
-            )
-            remove_button.setToolTip("移除此項設定")
-            remove_button.clicked.connect(lambda checked=False, cfg_id=config["id"]: self._remove_key_config(cfg_id)) # Added checked=False for lambda with PySide signal
-            item_layout.addWidget(remove_button)
+            if config["id"] not in self.key_rows:
+                self._create_key_row(config)
+            self._refresh_key_row(config)
+
+        self._publish_telemetry()
+
+    def _create_key_row(self, config):
+        item_widget = QWidget()
+        item_layout = QHBoxLayout(item_widget)
+        item_layout.setContentsMargins(8, 5, 8, 5) # top, bottom, left, right
+
+        checkbox = QCheckBox()
+        checkbox.setChecked(config["enabled"])
+        checkbox.stateChanged.connect(partial(self._toggle_key_config_enabled, config["id"]))
+        item_layout.addWidget(checkbox)
+
+        key_label = QLabel()
+        key_label.setToolTip(f"內部按鍵碼: {config['key_actual_for_pynput']}\nID: {config['id']}")
+        item_layout.addWidget(key_label)
+
+        interval_label = QLabel()
+        item_layout.addWidget(interval_label)
+
+        item_layout.addSpacerItem(QSpacerItem(20, 20, QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum))
+
+        remove_button = QPushButton("🗑️ 移除") # Trash can emoji
+        remove_button.setFixedSize(80, 28)
+        remove_button.setStyleSheet(
+            "QPushButton { background-color: #d9534f; color: white; border-radius: 3px; padding: 4px; }"
+            "QPushButton:hover { background-color: #c9302c; }"
+            "QPushButton:pressed { background-color: #ac2925; }"
+        )
+        remove_button.setToolTip("移除此項設定")
+        remove_button.clicked.connect(partial(self._on_remove_button_clicked, config["id"]))
+        item_layout.addWidget(remove_button)
+
+        list_item = QListWidgetItem(self.key_list_widget)
+        list_item.setSizeHint(item_widget.sizeHint()) # Important for custom widget
+        self.key_list_widget.setItemWidget(list_item, item_widget)
+        # Store config_id in the item itself for easier access if needed, though not strictly necessary here
+        list_item.setData(Qt.ItemDataRole.UserRole, config["id"])
+
+        self.key_rows[config["id"]] = {
+            "item": list_item,
+            "widget": item_widget,
+            "checkbox": checkbox,
+            "key_label": key_label,
+            "interval_label": interval_label,
+        }
+
+    def _refresh_key_row(self, config):
+        """依設定目前的狀態更新該列的文字與樣式"""
+        row = self.key_rows[config["id"]]
+
+        # Don't let syncing the checkbox loop back into _toggle_key_config_enabled
+        row["checkbox"].blockSignals(True)
+        row["checkbox"].setChecked(config["enabled"])
+        row["checkbox"].blockSignals(False)
+
+        key_display_str = config["display_name"]
+        # Attempt to make common special keys more readable
+        if "key." in key_display_str: # pynput special keys often come as "Key.something"
+            key_display_str = key_display_str.replace("key.", "").capitalize()
+
+        status_indicator = "▶️" if config.get("is_running") else "⏸️" # Play/Pause emoji as indicator
+        key_text = f"{status_indicator} 按鍵: <b>{key_display_str}</b>"
+        if config.get("is_running"):
+             key_text = f"<font color='green'>{key_text}</font>"
+        row["key_label"].setText(key_text)
 
-            list_item = QListWidgetItem(self.key_list_widget)
-            list_item.setSizeHint(item_widget.sizeHint()) # Important for custom widget
-            self.key_list_widget.addItem(list_item)
-            self.key_list_widget.setItemWidget(list_item, item_widget)
-            # Store config_id in the item itself for easier access if needed, though not strictly necessary here
-            list_item.setData(Qt.ItemDataRole.UserRole, config["id"])
+        row["interval_label"].setText(f"間隔: {config['interval']:.2f} 秒")
+        row["interval_label"].setStyleSheet("color: green;" if config.get("is_running") else "")
 
+    def _remove_key_row(self, config_id):
+        """移除設定對應的列，並明確釋放其 widget"""
+        row = self.key_rows.pop(config_id)
+        self.key_list_widget.removeItemWidget(row["item"])
+        row["widget"].deleteLater()
+        self.key_list_widget.takeItem(self.key_list_widget.row(row["item"]))
 
     @Slot()
     def _show_add_key_dialog(self):
@@ -144,7 +281,7 @@ class AutoClickerMainWindow(QMainWindow):
         dialog.exec() # exec_() for older Qt versions, exec() is fine in PySide6
 
     @Slot(str, object, float)
-    def _add_new_key_config(self, display_name, key_actual_for_pynput, interval):
+    def _add_new_key_config(self, display_name, key_actual_for_pynput, interval, refresh=True):
         # key_actual_for_pynput is what pynput's Controller.press() expects
         # (either a character string or a pynput.keyboard.Key object)
 
@@ -155,10 +292,13 @@ class AutoClickerMainWindow(QMainWindow):
             "interval": interval,
             "enabled": True, # Default to enabled
             "timer": None, # Placeholder for QTimer or thread
-            "is_running": False
+            "is_running": False,
+            "fire_count": 0, # Telemetry: key presses sent so far
+            "last_fired": None # Telemetry: time.time() of the last press
         }
         self.key_configs.append(new_config)
-        self._update_key_list_widget()
+        if refresh:
+            self._update_key_list_widget()
         # print(f"Added new key config: {new_config}")
 
     def _find_config_by_id(self, config_id):
@@ -167,17 +307,33 @@ class AutoClickerMainWindow(QMainWindow):
                 return config
         return None
 
+    def _release_config_timer(self, config):
+        """停止並釋放設定所擁有的 QTimer (若有)"""
+        # The config dict owns its timer: whenever the macro stops or the config
+        # goes away, the timer is stopped and handed back to Qt for deletion.
+        # Otherwise it would live on as a child of the main window forever.
+        timer = config.get("timer")
+        if timer is None:
+            return
+        timer.stop()
+        timer.deleteLater()
+        config["timer"] = None
+
+    def _on_remove_button_clicked(self, config_id, checked=False):
+        self._remove_key_config(config_id)
+
     @Slot(str)
-    def _remove_key_config(self, config_id_to_remove):
-        # Find and remove the item from self.key_configs
-        # Also stop its timer/thread if it's running (to be implemented later)
+    def _remove_key_config(self, config_id_to_remove, refresh=True):
+        # Find and remove the item from self.key_configs, releasing its timer
         config_to_remove = self._find_config_by_id(config_id_to_remove)
         if config_to_remove:
             if config_to_remove.get("is_running", False):
-                self._stop_single_macro(config_to_remove) # Stop before removing
+                self._stop_single_macro(config_to_remove, refresh=False) # Stop before removing
+            self._release_config_timer(config_to_remove)
 
             self.key_configs = [cfg for cfg in self.key_configs if cfg["id"] != config_id_to_remove]
-            self._update_key_list_widget()
+            if refresh:
+                self._update_key_list_widget()
             # print(f"Removed key config: {config_id_to_remove}")
         else:
             QMessageBox.warning(self, "錯誤", f"找不到要移除的設定 (ID: {config_id_to_remove})")
@@ -216,12 +372,15 @@ class AutoClickerMainWindow(QMainWindow):
         if config and config.get("is_running", False) and config.get("enabled", False):
             # print(f"Executing key: {config['display_name']}")
             press_and_release_key(config['key_actual_for_pynput'])
+            config["fire_count"] += 1
+            config["last_fired"] = time.time()
+            self._publish_fire_telemetry(config)
         elif config and config.get("timer"): # If timer exists but shouldn't run, stop it
             # This case might happen if it was disabled/stopped but timer fired one last time.
             self._stop_single_macro(config)
 
 
-    def _start_single_macro(self, config):
+    def _start_single_macro(self, config, refresh=True):
         if not config or not config.get("enabled", False) or config.get("is_running", False):
             return
 
@@ -229,42 +388,38 @@ class AutoClickerMainWindow(QMainWindow):
             return
 
         if not config.get("timer"): # Create timer if it doesn't exist
-            config["timer"] = QTimer(self) # Parent it to self for auto-cleanup (maybe)
-            # Using lambda to pass config_id. functools.partial is another option.
-            config["timer"].timeout.connect(lambda cid=config["id"]: self._trigger_key_action(cid))
+            # Parented to self as a safety net; the config owns it and
+            # _release_config_timer() deletes it when the macro stops.
+            config["timer"] = QTimer(self)
+            config["timer"].timeout.connect(partial(self._trigger_key_action, config["id"]))
 
         config["timer"].setInterval(int(config["interval"] * 1000)) # ms
         config["timer"].start()
         config["is_running"] = True
         # print(f"Started macro: {config['display_name']}")
-        self._update_key_list_widget() # Reflect running state (e.g. change icon, not implemented yet)
+        if refresh:
+            self._update_key_list_widget() # Reflect running state
 
-    def _stop_single_macro(self, config):
+    def _stop_single_macro(self, config, refresh=True):
         if not config or not config.get("is_running", False):
             return
 
-        if config.get("timer"):
-            config["timer"].stop()
-            # We can choose to delete the timer or reuse it. For simplicity, let's keep it.
-            # If we delete:
-            # config["timer"].deleteLater()
-            # config["timer"] = None
+        self._release_config_timer(config)
         config["is_running"] = False
         # print(f"Stopped macro: {config['display_name']}")
-        self._update_key_list_widget() # Reflect running state
-
-    @Slot()
-    def _start_all_macros(self):
-        if not self.key_configs:
-            QMessageBox.information(self, "提示", "請先新增至少一個按鍵設定。")
-            return
+        if refresh:
+            self._update_key_list_widget() # Reflect running state
 
+    def _start_enabled_macros(self, refresh=True):
+        """啟動所有已啟用的設定，回傳是否至少啟動了一個"""
         self.is_globally_running = True
         one_started = False
         for config in self.key_configs:
             if config.get("enabled", False):
-                self._start_single_macro(config)
+                self._start_single_macro(config, refresh=False)
                 one_started = True
+        if refresh:
+            self._update_key_list_widget() # Refresh the rows once for the whole batch
 
         if one_started:
             self.start_all_button.setEnabled(False)
@@ -272,17 +427,32 @@ class AutoClickerMainWindow(QMainWindow):
             # print("All enabled macros started.")
         else:
             self.is_globally_running = False # No enabled macros were actually started
+        return one_started
+
+    @Slot()
+    def _start_all_macros(self):
+        if not self.key_configs:
+            QMessageBox.information(self, "提示", "請先新增至少一個按鍵設定。")
+            return
+
+        if not self._start_enabled_macros():
             QMessageBox.information(self, "提示", "沒有已啟用的按鍵設定可以開始。")
 
 
     @Slot()
     def _stop_all_macros(self):
+        self._stop_running_macros()
+
+    def _stop_running_macros(self, refresh=True):
+        """停止所有執行中的設定"""
         self.is_globally_running = False
         any_stopped = False
         for config in self.key_configs:
             if config.get("is_running", False):
-                self._stop_single_macro(config)
+                self._stop_single_macro(config, refresh=False)
                 any_stopped = True
+        if any_stopped and refresh:
+            self._update_key_list_widget() # Refresh the rows once for the whole batch
 
         # Always update button state after stop all, even if nothing was technically running
         # This handles cases where user might have manually disabled all items then hits stop.
@@ -293,17 +463,219 @@ class AutoClickerMainWindow(QMainWindow):
         # else:
             # print("No macros were running to stop.")
 
+    # --- Control server support -------------------------------------------
+    # The methods below without a leading underscore are called from
+    # ControlServer threads; everything else runs on the GUI thread.
+
+    def control_telemetry(self):
+        """回傳最近一次發布的狀態 (可在任意執行緒呼叫，不經過 GUI 執行緒)"""
+        return self.telemetry_snapshot
+
+    def execute_control_batch(self, commands):
+        """
+        將一批控制命令交給 GUI 執行緒一次套用，並等待結果。
+        :return: 每個命令的結果列表
+        :raises ControlError: 任一命令無效 (此時不會套用任何命令) 或 GUI 執行緒逾時
+                              (此時也不會再套用)
+        """
+        request = self._new_control_request(commands)
+        self.control_batch_requested.emit(request)
+        if not request["done"].wait(self.CONTROL_TIMEOUT_SECONDS):
+            with request["lock"]:
+                if not request["started"]:
+                    # Still queued: make sure the GUI thread skips it later
+                    request["cancelled"] = True
+                    raise ControlError("timed out waiting for the GUI thread")
+            # Already being applied; report the real outcome rather than a timeout
+            request["done"].wait()
+        if request["error"] is not None:
+            raise ControlError(request["error"])
+        return request["results"]
+
+    @staticmethod
+    def _new_control_request(commands):
+        return {
+            "commands": commands,
+            "lock": threading.Lock(), # Guards "started" / "cancelled"
+            "started": False,
+            "cancelled": False,
+            "done": threading.Event(),
+            "results": None,
+            "error": None,
+        }
+
+    def _build_telemetry(self):
+        return {
+            "running": any(config.get("is_running", False) for config in self.key_configs),
+            "configs": tuple(self._config_telemetry(config) for config in self.key_configs),
+        }
+
+    def _publish_telemetry(self):
+        self.telemetry_snapshot = self._build_telemetry()
+        self.telemetry_index = {config["id"]: i for i, config in enumerate(self.key_configs)}
+
+    def _publish_fire_telemetry(self, config):
+        """按鍵送出後只替換該設定的 telemetry 項目，避免每次都重建全部"""
+        index = self.telemetry_index.get(config["id"])
+        if index is None:
+            self._publish_telemetry()
+            return
+        snapshot = self.telemetry_snapshot
+        configs = snapshot["configs"]
+        self.telemetry_snapshot = {
+            "running": snapshot["running"],
+            "configs": configs[:index] + (self._config_telemetry(config),) + configs[index + 1:],
+        }
+
+    @staticmethod
+    def _config_telemetry(config):
+        return {
+            "id": config["id"],
+            "display_name": config["display_name"],
+            "key": str(config["key_actual_for_pynput"]),
+            "interval": config["interval"],
+            "enabled": config["enabled"],
+            "is_running": config["is_running"],
+            "fire_count": config["fire_count"],
+            "last_fired": config["last_fired"],
+        }
+
+    @Slot(object)
+    def _on_control_batch_requested(self, request):
+        try:
+            with request["lock"]:
+                if request["cancelled"]: # The client already gave up on it
+                    return
+                request["started"] = True
+
+            try:
+                # Validate the whole batch before touching anything, so a batch
+                # is applied either completely or not at all.
+                self._validate_control_commands(request["commands"])
+                request["results"] = [self._apply_control_command(cmd) for cmd in request["commands"]]
+            except ControlError as e:
+                request["error"] = str(e)
+            except Exception as e:
+                # Validation should make this unreachable; if it does happen the
+                # batch may be partially applied, so say so.
+                traceback.print_exc()
+                request["error"] = f"internal error, batch may be partially applied: {type(e).__name__}: {e}"
+
+            try:
+                self._update_key_list_widget() # Refresh the rows once for the whole batch
+                self._update_global_controls()
+            except Exception:
+                traceback.print_exc()
+        finally:
+            request["done"].set()
+
+    def _validate_interval(self, index, interval):
+        if (isinstance(interval, bool) or not isinstance(interval, (int, float))
+                or not math.isfinite(interval)
+                or not self.MIN_INTERVAL_SECONDS <= interval <= self.MAX_INTERVAL_SECONDS):
+            raise ControlError(
+                f"command {index}: interval must be a number of seconds between "
+                f"{self.MIN_INTERVAL_SECONDS} and {self.MAX_INTERVAL_SECONDS:.0f}"
+            )
+
+    def _validate_control_commands(self, commands):
+        known_ids = {config["id"] for config in self.key_configs}
+        for index, command in enumerate(commands):
+            if not isinstance(command, dict):
+                raise ControlError(f"command {index}: expected a JSON object")
+            cmd = command.get("cmd")
+            config_id = command.get("config_id")
+            if not isinstance(cmd, str):
+                raise ControlError(f"command {index}: cmd must be a string")
+            if config_id is not None and not isinstance(config_id, str):
+                raise ControlError(f"command {index}: config_id must be a string")
+
+            if cmd == "telemetry":
+                continue
+            if cmd == "add":
+                try:
+                    parse_key(command.get("key"))
+                except ValueError as e:
+                    raise ControlError(f"command {index}: {e}")
+                self._validate_interval(index, command.get("interval"))
+                if not isinstance(command.get("enabled", True), bool):
+                    raise ControlError(f"command {index}: enabled must be true or false")
+                if not isinstance(command.get("display_name", ""), str):
+                    raise ControlError(f"command {index}: display_name must be a string")
+                continue
+            if cmd not in ("remove", "start", "stop", "update"):
+                raise ControlError(f"command {index}: unknown cmd {cmd!r}")
+
+            if config_id is None and cmd in ("start", "stop"):
+                continue # start/stop everything
+            if config_id not in known_ids:
+                raise ControlError(f"command {index}: unknown config_id {config_id!r}")
+            if cmd == "remove":
+                known_ids.discard(config_id) # Later commands in the batch can't use it
+            elif cmd == "update":
+                if "interval" in command:
+                    self._validate_interval(index, command["interval"])
+                if not isinstance(command.get("enabled", True), bool):
+                    raise ControlError(f"command {index}: enabled must be true or false")
+
+    def _apply_control_command(self, command):
+        """
+        套用一個已驗證過的命令。這裡不刷新列表也不發布 telemetry，由呼叫端
+        在整批套用完後統一處理，其他執行緒才不會看到套用到一半的批次。
+        """
+        cmd = command["cmd"]
+        config = self._find_config_by_id(command.get("config_id"))
+
+        if cmd == "telemetry":
+            return self._build_telemetry() # Live state at this point of the batch
+        if cmd == "add":
+            key = parse_key(command["key"])
+            display_name = command.get("display_name") or (key if isinstance(key, str) else key.name)
+            self._add_new_key_config(display_name, key, float(command["interval"]), refresh=False)
+            config = self.key_configs[-1]
+            config["enabled"] = command.get("enabled", True)
+            return config["id"]
+        if cmd == "remove":
+            self._remove_key_config(config["id"], refresh=False)
+        elif cmd == "start":
+            if config is None:
+                self._start_enabled_macros(refresh=False)
+            else:
+                self._start_single_macro(config, refresh=False)
+        elif cmd == "stop":
+            if config is None:
+                self._stop_running_macros(refresh=False)
+            else:
+                self._stop_single_macro(config, refresh=False)
+        elif cmd == "update":
+            if "enabled" in command:
+                config["enabled"] = command["enabled"]
+                if not config["enabled"]:
+                    self._stop_single_macro(config, refresh=False)
+            if "interval" in command:
+                config["interval"] = float(command["interval"])
+                if config.get("timer"):
+                    config["timer"].setInterval(int(config["interval"] * 1000)) # ms
+        return None
+
+    def _update_global_controls(self):
+        """依目前是否有設定在執行，同步全域狀態與開始/停止按鈕"""
+        any_running = any(config.get("is_running", False) for config in self.key_configs)
+        self.is_globally_running = any_running
+        self.start_all_button.setEnabled(not any_running)
+        self.stop_all_button.setEnabled(any_running)
+
     def closeEvent(self, event):
         """Ensure all macros are stopped when the window is closed."""
         # print("Close event triggered. Stopping all macros.")
         self._stop_all_macros() # Attempt to stop all running macros
+        self.profile_show_result = False # No dialogs while closing
+        self.stop_profiling() # Write out a capture that is still running
 
-        # Clean up timers explicitly, though being parented might handle some of this.
-        # for config in self.key_configs:
-        #     if config.get("timer"):
-        #         config["timer"].stop()
-        #         config["timer"].deleteLater() # Request Qt to delete when safe
-        #         config["timer"] = None
+        # Release any timer still owned by a config (e.g. one that fired after
+        # its macro was disabled) instead of relying on Qt parent cleanup.
+        for config in self.key_configs:
+            self._release_config_timer(config)
 
         event.accept() # Proceed with closing the window
 
@@ -1,14 +1,41 @@
 import sys
 import os
+import argparse
 from PySide6.QtWidgets import QApplication
 
 # When running with "python -m src.main", 'src' is treated as a package.
 # The import ".gui.main_window" means "from the current package (src),
 # import the 'gui' subpackage, and from it, import AutoClickerMainWindow".
 from .gui.main_window import AutoClickerMainWindow
+from .core.profiler import DEFAULT_PROFILE_DIR, MAX_PROFILE_SECONDS
+from .core.control_server import ControlServer, DEFAULT_CONTROL_SOCKET
+
+def positive_seconds(value):
+    seconds = float(value)
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        raise argparse.ArgumentTypeError(f"必須是大於 0 且不超過 {MAX_PROFILE_SECONDS} 的秒數: {value}")
+    return seconds
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="macOS 自動按鍵程式")
+    parser.add_argument(
+        "--profile", type=positive_seconds, metavar="SECONDS",
+        help="啟動後立即擷取 SECONDS 秒的 CPU (pstats) 與記憶體配置報告"
+    )
+    parser.add_argument(
+        "--profile-dir", default=DEFAULT_PROFILE_DIR, metavar="DIR",
+        help=f"效能分析結果的輸出目錄 (預設: {DEFAULT_PROFILE_DIR})"
+    )
+    parser.add_argument(
+        "--control-socket", nargs="?", const=DEFAULT_CONTROL_SOCKET, metavar="PATH",
+        help=f"啟用本機控制 socket (預設路徑: {DEFAULT_CONTROL_SOCKET})"
+    )
+    # Anything we don't know about is left for Qt (e.g. -platform, -style)
+    return parser.parse_known_args(argv[1:])
 
 def main():
-    app = QApplication(sys.argv)
+    args, qt_args = parse_args(sys.argv)
+    app = QApplication(sys.argv[:1] + qt_args)
     # app.setQuitOnLastWindowClosed(True) # Default behavior
 
     # For a more native macOS menu bar experience, especially if you add menus later
@@ -17,7 +44,24 @@ def main():
     window = AutoClickerMainWindow()
     window.show()
 
-    sys.exit(app.exec())
+    if args.profile is not None:
+        window.start_profiling(args.profile, output_dir=args.profile_dir)
+
+    control_server = None
+    if args.control_socket:
+        control_server = ControlServer(
+            args.control_socket, window.control_telemetry, window.execute_control_batch
+        )
+        try:
+            control_server.start()
+        except OSError as e: # e.g. another instance already owns the socket
+            print(f"無法啟動控制 socket: {e}")
+            control_server = None
+
+    exit_code = app.exec()
+    if control_server:
+        control_server.stop()
+    sys.exit(exit_code)
 
 if __name__ == '__main__':
     # This special variable `__package__` is set when Python loads a module
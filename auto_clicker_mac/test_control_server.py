@@ -0,0 +1,209 @@
+# test_control_server.py
+# Offscreen tests for the control socket protocol and batch handling.
+#
+# Usage (from the auto_clicker_mac directory):
+#   python -m unittest test_control_server
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+# No window is shown and no real key may be pressed while testing.
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ.setdefault("PYNPUT_BACKEND", "dummy")
+
+from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import QCoreApplication
+
+from src.core.control_server import ControlServer, ControlError, MAX_FRAME_BYTES
+from src.gui import main_window
+from src.gui.main_window import AutoClickerMainWindow
+
+app = QApplication.instance() or QApplication([])
+
+
+def decode(response_line):
+    return json.loads(response_line)
+
+
+class ControlBatchTest(unittest.TestCase):
+    def setUp(self):
+        self._press = main_window.press_and_release_key
+        main_window.press_and_release_key = lambda key: True
+        self.window = AutoClickerMainWindow()
+        self.server = ControlServer("/unused", self.window.control_telemetry, self.run_batch)
+
+    def tearDown(self):
+        main_window.press_and_release_key = self._press
+        self.window.close()
+        self.window.deleteLater()
+
+    def run_batch(self, commands):
+        """Apply a batch on this (the GUI) thread, like execute_control_batch would."""
+        request = self.window._new_control_request(commands)
+        self.window._on_control_batch_requested(request)
+        self.assertTrue(request["done"].is_set())
+        if request["error"] is not None:
+            raise ControlError(request["error"])
+        return request["results"]
+
+    def send(self, frame):
+        line = frame if isinstance(frame, bytes) else json.dumps(frame).encode("utf-8")
+        return decode(self.server.handle_frame(line))
+
+    def add(self, key="a", interval=0.5):
+        return self.send({"cmd": "add", "key": key, "interval": interval})["result"]
+
+    def test_valid_batch_is_applied(self):
+        response = self.send({"id": 7, "batch": [
+            {"cmd": "add", "key": "a", "interval": 0.5},
+            {"cmd": "add", "key": "space", "interval": 1, "enabled": False},
+            {"cmd": "start"},
+        ]})
+        self.assertEqual(response["id"], 7)
+        self.assertTrue(response["ok"])
+        configs = self.window.control_telemetry()["configs"]
+        self.assertEqual([c["is_running"] for c in configs], [True, False])
+
+    def test_invalid_batch_applies_nothing(self):
+        config_id = self.add()
+        bad_commands = [
+            {"cmd": "add", "key": "c", "interval": 0.5, "display_name": 5},
+            {"cmd": "add", "key": "c", "interval": True},
+            {"cmd": "add", "key": "c", "interval": 1e-4},
+            {"cmd": "add", "key": "c", "interval": 1e300},
+            {"cmd": "add", "key": "not-a-key", "interval": 1},
+            {"cmd": "remove", "config_id": ["x"]},
+            {"cmd": ["start"]},
+            {"cmd": "bogus"},
+            {"cmd": "update", "config_id": "missing", "interval": 1},
+        ]
+        for bad in bad_commands:
+            with self.subTest(bad=bad):
+                response = self.send({"batch": [
+                    {"cmd": "add", "key": "b", "interval": 0.5},
+                    {"cmd": "start", "config_id": config_id},
+                    bad,
+                ]})
+                self.assertFalse(response["ok"])
+                self.assertIn("command 2", response["error"])
+                self.assertEqual([c["id"] for c in self.window.key_configs], [config_id])
+                self.assertFalse(self.window.key_configs[0]["is_running"])
+
+    def test_removed_config_id_is_unknown_later_in_batch(self):
+        config_id = self.add()
+        response = self.send({"batch": [
+            {"cmd": "remove", "config_id": config_id},
+            {"cmd": "start", "config_id": config_id},
+        ]})
+        self.assertFalse(response["ok"])
+        self.assertIn("unknown config_id", response["error"])
+        self.assertEqual(len(self.window.key_configs), 1)
+
+    def test_non_finite_numbers_are_rejected(self):
+        for literal in (b"NaN", b"Infinity", b"-Infinity"):
+            with self.subTest(literal=literal):
+                response = self.send(b'{"cmd":"add","key":"a","interval":' + literal + b'}')
+                self.assertEqual(response, {"id": None, "ok": False, "error": "invalid JSON"})
+        self.assertEqual(self.window.key_configs, [])
+
+    def test_unexpected_exception_becomes_error_response(self):
+        def boom(commands):
+            raise RuntimeError("boom")
+        self.server._execute = boom
+        response = self.send({"id": 1, "cmd": "stop"})
+        self.assertFalse(response["ok"])
+        self.assertIn("RuntimeError", response["error"])
+
+    def test_telemetry_is_published_once_per_batch(self):
+        published = []
+        publish = self.window._publish_telemetry
+
+        def recording_publish():
+            publish()
+            published.append(len(self.window.telemetry_snapshot["configs"]))
+        self.window._publish_telemetry = recording_publish
+
+        self.send({"batch": [{"cmd": "add", "key": k, "interval": 1} for k in "abcde"]})
+        self.send({"batch": [{"cmd": "start"}, {"cmd": "stop"}]})
+        self.assertEqual(published, [5, 5])
+
+    def test_fire_replaces_only_that_telemetry_entry(self):
+        first, second = self.add("a"), self.add("b")
+        self.send({"cmd": "start"})
+        before = self.window.control_telemetry()["configs"]
+        self.window._trigger_key_action(second)
+        after = self.window.control_telemetry()["configs"]
+        self.assertIs(after[0], before[0])
+        self.assertEqual(after[1]["id"], second)
+        self.assertEqual(after[1]["fire_count"], 1)
+        self.assertEqual(before[1]["fire_count"], 0) # Old snapshot left untouched
+
+    def test_timed_out_batch_is_not_applied_later(self):
+        self.window.CONTROL_TIMEOUT_SECONDS = 0.05
+        # Nothing processes the queued signal while we wait, so this times out
+        with self.assertRaises(ControlError):
+            self.window.execute_control_batch([{"cmd": "add", "key": "a", "interval": 1}])
+        QCoreApplication.processEvents()
+        self.assertEqual(self.window.key_configs, [])
+
+
+class ControlSocketTest(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "control.sock")
+        self.executed = []
+
+        def execute(commands):
+            self.executed.append(commands)
+            return [None] * len(commands)
+        self.server = ControlServer(self.path, lambda: {"running": False, "configs": []}, execute)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def connect(self):
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.settimeout(5)
+        client.connect(self.path)
+        return client, client.makefile("rb")
+
+    def test_oversized_frame_gets_error_and_disconnect(self):
+        client, reader = self.connect()
+        client.sendall(b"x" * (MAX_FRAME_BYTES + 10))
+        response = decode(reader.readline())
+        self.assertFalse(response["ok"])
+        self.assertIn("exceeds", response["error"])
+        self.assertEqual(reader.readline(), b"")
+        client.close()
+
+    def test_stop_disconnects_connected_clients(self):
+        client, reader = self.connect()
+        client.sendall(b'{"cmd":"ping"}\n')
+        self.assertEqual(decode(reader.readline())["result"], "pong")
+
+        self.server.stop()
+        try:
+            client.sendall(b'{"cmd":"start"}\n')
+            self.assertEqual(reader.readline(), b"")
+        except OSError:
+            pass # Also fine: the connection is gone
+        time.sleep(0.05)
+        self.assertEqual(self.executed, [])
+        client.close()
+
+    def test_second_instance_does_not_take_over(self):
+        other = ControlServer(self.path, lambda: {}, lambda commands: [])
+        with self.assertRaises(OSError):
+            other.start()
+        client, reader = self.connect()
+        client.sendall(b'{"cmd":"ping"}\n')
+        self.assertTrue(decode(reader.readline())["ok"])
+        client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()